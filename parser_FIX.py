@@ -4,13 +4,18 @@
 # DATE  :      05/23/2018
 # AUTHOR:      Lila Fata
 # FILE  :      parser_FIX.py
-# DESCRIPTION: This script file contains the following five functions to download a 'secdef' zipped file
+# DESCRIPTION: This script file contains the following functions to download a 'secdef' zipped file
 #              from the CME Group public FTP site, unzipped the secdef file, parses the file, extract
 #              certain data from the file to answer the three questions below, and prints the results to
 #              the output screen.
 #
-#              * download_secdef_zipfile() - download and unzip secdef.dat.gz file from FTP cmegroup
-#              * parse_secdef_file() - parse and extract relevant data and store in dictionaries
+#              * download_secdef_zipfile() - download and unzip on the fly secdef.dat.gz file from FTP cmegroup
+#              * open_secdef_zipfile() - unzip a local secdef.dat.gz file
+#              * read_secdef_chunks() - read secdef data in blocks of complete rows
+#              * scan_secdef_blocks() - count security types and search futures rows for the fields of interest
+#              * parse_secdef_file() - parse and extract relevant data and return it in dictionaries
+#              * parse_secdef_zipfile() - unzip and parse a local secdef.dat.gz file
+#              * merge_secdef_results() - merge the data extracted from several secdef files
 #              * print_solution1() - prints output of solution to question 1
 #              * print_solution2() - prints output of solution to question 2
 #              * print_solution3() - prints output of solution to question 3
@@ -36,131 +41,377 @@
 #
 ##########################################################################################################
 
+import argparse
+import bisect
+import io
+import mmap
 import os
+import re
 import urllib.request
 import gzip
 import shutil
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
-SOH = '\x01'                        # Delimiter Start Of Header (SOH) in secdef.DAT file
-SECURITY_TYPE_TAG = '167'           # Security Type (tag 167)
-FUTURES = 'FUT'                     # Futures (tag 167) Instrument
-UNDERLYING_PRODUCT_TAG = '462'      # Product Complex (tag 462)
-ASSET_GE = '6937=GE'                # Asset=GE (tag 6937)
-NOLEGS_TAG = '555'                  # NoLegs (tag 555)
-NAMES_TAG = '55'                    # Name / Symbol (tag 55)
-EXPIRATION_TAG = '200'              # Expiration / MaturityMonthYear (tag 200)
-
-# Dictionary to store number of instruments (initialized to 0) for each security type
-d167 = {}
-d167.setdefault('FUT', 0)
-d167.setdefault('OOF', 0)
-d167.setdefault('MLEG', 0)
-d167.setdefault('IRS', 0)
-d167.setdefault('FXSPOT', 0)
-
-# Dictionary to store number of futures instruments (initialized to 0) for each product complex
-d462 = {}
-d462.setdefault('2', 0)
-d462.setdefault('4', 0)
-d462.setdefault('5', 0)
-d462.setdefault('12', 0)
-d462.setdefault('14', 0)
-d462.setdefault('15', 0)
-d462.setdefault('16', 0)
-d462.setdefault('17', 0)
-
-# Dictionary to store names / expirations for futures instruments with asset 'GE' and zero legs
-dNameExpiration = {}
+try:
+    import rapidgzip                # Optional parallel gzip decompression, used when installed
+except ImportError:
+    rapidgzip = None
+
+SECDEF_URL = 'ftp://ftp.cmegroup.com/SBEFix/Production/secdef.dat.gz'   # URL of CME Group public FTP site
+DOWNLOAD_TIMEOUT = 30               # Seconds to wait for the secdef.dat.gz server before giving up
+SECDEF_FILENAME = 'secdef.DAT'      # Unzipped secdef file
+GZIP_BUFFER_SIZE = 262144           # Read buffer size for the zipped secdef.dat.gz data
+READ_CHUNK_SIZE = 131072            # Size of the blocks of unzipped secdef data handed to the parser
+
+# secdef.DAT is pure ASCII, so it is read and parsed as raw bytes; only extracted values are decoded
+SOH = b'\x01'                       # Delimiter Start Of Header (SOH) in secdef.DAT file
+SECURITY_TYPE_TAG = b'167'          # Security Type (tag 167)
+FUTURES = b'FUT'                    # Futures (tag 167) Instrument
+UNDERLYING_PRODUCT_TAG = b'462'     # Product Complex (tag 462)
+ASSET_TAG = b'6937'                 # Asset (tag 6937)
+ASSET_GE = b'GE'                    # Asset GE (tag 6937)
+NOLEGS_TAG = b'555'                 # NoLegs (tag 555)
+NAMES_TAG = b'55'                   # Name / Symbol (tag 55)
+EXPIRATION_TAG = b'200'             # Expiration / MaturityMonthYear (tag 200)
+
+# Fields searched for directly in each futures row: product complex (tag 462) is needed for every
+# futures row, asset GE (6937=GE) decides if the row has to be scanned for the question 3 fields.
+# The asset tag and value are checked together by one search for the whole field, so no other field
+# of the row is ever compared against them
+UNDERLYING_PRODUCT_FIELD = SOH + UNDERLYING_PRODUCT_TAG + b'='
+ASSET_GE_FIELD = SOH + ASSET_TAG + b'=' + ASSET_GE + SOH
+
+# Pattern scanned over each futures row with asset GE.  Each tag of interest has its own capture group,
+# so the index of the last matched group identifies the tag as an integer code without building the tag
+# string, and is used directly as the slot for the tag value in a per-row table instead of an if/elif
+# chain.  Fields are matched on their leading SOH since every row starts with the message type (tag 35).
+# The value of tag 555 is never needed, so group 1 is an empty capture that only marks that tag 555 is present.
+# Fields of no interest are rejected in layers: rows other than futures with asset GE are never scanned,
+# and within a scanned row the pattern is only tried at each SOH.  A field whose tag starts with neither
+# 2 nor 5 fails on the first tag byte; the others (ie. 22=, 207=, 562=, 5796=) fail a few bytes later.
+FIELD_VALUE = rb'=([^\x01\n]*)'
+SECDEF_FIELD_RE = re.compile(SOH + b'(?:' +
+                             NOLEGS_TAG + rb'()=|' +                          # group 1: nolegs
+                             NAMES_TAG + FIELD_VALUE + b'|' +                 # group 2: names
+                             EXPIRATION_TAG + FIELD_VALUE + b')')             # group 3: expiration
+NOLEGS_CODE = 1
+NAMES_CODE = 2
+EXPIRATION_CODE = 3
+ROW_FIELD_SLOTS = 4                 # Slots for the field values of a row, indexed by tag code
+
+# Security types (tag 167) and product complexes (tag 462) reported, in output order
+SECURITY_TYPES = ['FUT', 'OOF', 'MLEG', 'IRS', 'FXSPOT']
+PRODUCT_COMPLEXES = ['2', '4', '5', '12', '14', '15', '16', '17']
+
+# Raw security type values mapped to the canonical d167 keys, so known values are never decoded again
+SECURITY_TYPE_KEYS = {key.encode('ascii'): key for key in SECURITY_TYPES}
+
+# Security type field (tag 167) values are all collected by one C-level regex scan of the secdef data
+# and counted with a Counter; futures rows are found by searching for the futures field (SOH 167=FUT SOH).
+# Every FIX field is terminated by SOH, including the last field of a row
+SECURITY_TYPE_RE = re.compile(SOH + SECURITY_TYPE_TAG + FIELD_VALUE + SOH)
+FUTURES_FIELD = SOH + SECURITY_TYPE_TAG + b'=' + FUTURES + SOH
+
+# Raw product complex values mapped to the canonical d462 keys, so known values are never decoded again
+PRODUCT_COMPLEX_KEYS = {key.encode('ascii'): key for key in PRODUCT_COMPLEXES}
+
+# Number of earliest expirations reported for futures instruments with asset 'GE' and zero legs
+EARLIEST_EXPIRATIONS = 4
 
 ##########################################################################################################
-# FUNCTION:    download_secdef_zipfile()
-# DESCRIPTION: Downloads secdef.dat.gz zipped file from ftp.cmegroup.com, and unzips file, and stores
-#              in current working directory
-# INPUT:       secdef.dat.gz zipped file from FTP cmegroup.com
-# OUTPUT:      secdef.DAT file
-##########################################################################################################
-def download_secdef_zipfile():
-    print("\nDownloading 'secdef.dat.gz' zip file from ftp.cmegroup.com...\n")
-    current_dir = os.getcwd()
-    print ("Working directory is ", current_dir)
+# CLASS:       _ClosingGzipFile
+# DESCRIPTION: GzipFile that also closes the file object it reads from.  GzipFile leaves a given
+#              fileobj open, which would leak the downloaded network response
+##########################################################################################################
+class _ClosingGzipFile(gzip.GzipFile):
+    def close(self):
+        fileobj = self.fileobj                              #Set to None by GzipFile.close()
+        try:
+            super().close()
+        finally:
+            if fileobj is not None:
+                fileobj.close()                             #Close the network response
+
+##########################################################################################################
+# FUNCTION:    _download()
+# DESCRIPTION: Opens secdef.dat.gz zipped file at url for reading unzipped data while it is downloaded
+# INPUT:       URL of secdef.dat.gz zipped file
+# OUTPUT:      Binary file object with the unzipped secdef data, or None on error
+##########################################################################################################
+def _download(url):
     try:
-        url = 'ftp://ftp.cmegroup.com/SBEFix/Production/secdef.dat.gz'  #URL of CME Group public FTP site
-        secdefzip_filename = 'secdef.dat.gz'
-        urllib.request.urlretrieve(url, secdefzip_filename)  #Get zipped secdef file from the FTP site
-
-        print("\nDownload complete...\n")
-        zipfilepath = os.path.realpath(secdefzip_filename)
-        print ("Path of zipped file is ", zipfilepath)
-
-        print("\nUnzipping 'secdef.dat.gz' file...\n")
-        with gzip.open(zipfilepath, 'rb') as sfile_in:     #Unzip and store secdef file in current directory
-            with open('secdef.DAT', 'wb') as sfile_out:
-                shutil.copyfileobj(sfile_in, sfile_out)
-        secdef_filename = 'secdef.DAT'            
-        filepath = os.path.realpath(secdef_filename)
-        print ("Path of unzipped file is ", filepath)
+        response = urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT)   #Open zipped secdef file at url
+    except (OSError, ValueError):                          #Unreachable server (URLError), timeout or invalid url
+        print("\nDownload FTP error!\n")
+        return None
+    response = io.BufferedReader(response, buffer_size=GZIP_BUFFER_SIZE)
+    return _ClosingGzipFile(fileobj=response)               #Unzip while downloading
+
+##########################################################################################################
+# FUNCTION:    _gunzip()
+# DESCRIPTION: Unzips secdef data from an opened zipped file object and stores it in a file
+# INPUT:       Binary file object with the unzipped secdef data, path of the unzipped file to store
+# OUTPUT:      True if the file was stored, or False on error (any partially stored file is removed)
+##########################################################################################################
+def _gunzip(src, dst):
+    try:
+        with src, open(dst, 'wb') as sfile_out:
+            shutil.copyfileobj(src, sfile_out)
         return True
-    except:
+    except (OSError, EOFError):                           #Broken download (URLError) or bad zip data (BadGzipFile)
         print("\nDownload FTP error!\n")
-        return False                                 
+        try:
+            os.remove(dst)                                 #Do not leave a partial secdef file behind
+        except FileNotFoundError:
+            pass
+        return False
+
+##########################################################################################################
+# FUNCTION:    download_secdef_zipfile()
+# DESCRIPTION: Opens secdef.dat.gz zipped file at url (CME Group public FTP site by default, or any
+#              FTP/HTTP/HTTPS mirror) and unzips it on the fly while it is
+#              being downloaded, so the parser reads straight from the network.  If keep_secdef is set,
+#              the unzipped file is instead stored as secdef.DAT in current working directory.  The
+#              working directory and file path are only printed if verbose is set.  Only download and
+#              unzip errors are handled; any other error is raised
+# INPUT:       URL of secdef.dat.gz zipped file, keep_secdef and verbose flags
+# OUTPUT:      Binary file object with the unzipped secdef data, or absolute path of the secdef.DAT
+#              file if keep_secdef is set, or None on error
+##########################################################################################################
+def download_secdef_zipfile(url=SECDEF_URL, keep_secdef=False, verbose=False):
+    print("\nDownloading 'secdef.dat.gz' zip file from ", url, "...\n")
+    if verbose:
+        print ("Working directory is ", os.getcwd())
+    sfile_in = _download(url)                             #Open zipped secdef file at url and unzip while downloading
+    if sfile_in is None:
+        return None
+    if not keep_secdef:
+        print("\nStreaming and unzipping 'secdef.dat.gz' file...\n")
+        return sfile_in
+
+    print("\nUnzipping 'secdef.dat.gz' file...\n")
+    secdef_filepath = os.path.abspath(SECDEF_FILENAME)
+    if not _gunzip(sfile_in, secdef_filepath):            #Unzip and store secdef file in current directory
+        return None
+    if verbose:
+        print ("Path of unzipped file is ", secdef_filepath)
+    return secdef_filepath
+
+##########################################################################################################
+# CLASS:       _RapidgzipReader
+# DESCRIPTION: Reader over a rapidgzip file that raises OSError when the zipped data can not be
+#              decoded, like the gzip module does.  rapidgzip raises RuntimeError instead
+##########################################################################################################
+class _RapidgzipReader(io.IOBase):
+    def __init__(self, rapidgzip_file):
+        self.rapidgzip_file = rapidgzip_file
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        try:
+            return self.rapidgzip_file.read(size)
+        except RuntimeError as error:                      #Bad or truncated zip data
+            raise OSError(error) from error
+
+    def close(self):
+        if not self.closed:
+            self.rapidgzip_file.close()
+        super().close()
+
+##########################################################################################################
+# FUNCTION:    open_secdef_zipfile()
+# DESCRIPTION: Opens a local secdef.dat.gz zipped file (ie. the sample file in this repository) for
+#              reading unzipped data.  The optional rapidgzip module is used when installed, since it
+#              unzips in parallel (on all cores by default); otherwise the standard gzip module is used
+# INPUT:       Path of secdef.dat.gz zipped file, number of rapidgzip threads (all cores if None)
+# OUTPUT:      Binary file object with the unzipped secdef data, or None on error
+##########################################################################################################
+def open_secdef_zipfile(zipfilepath, parallelization=None):
+    print("\nUnzipping ", zipfilepath, " file...\n")
+    try:
+        if rapidgzip is not None:
+            return _RapidgzipReader(rapidgzip.open(zipfilepath,
+                                                   parallelization=parallelization or os.cpu_count()))
+        return gzip.open(zipfilepath, 'rb')
+    except (OSError, ValueError):                          #rapidgzip raises ValueError for a missing file
+        print("\nFile not found error!\n")
+        return None
+
+##########################################################################################################
+# FUNCTION:    read_secdef_chunks()
+# DESCRIPTION: Reads secdef data in large blocks and yields them cut on row boundaries, so each block
+#              holds complete rows only and can be scanned on its own
+# INPUT:       Binary file object with the secdef data
+# OUTPUT:      Blocks of complete rows, each ending with a newline
+##########################################################################################################
+def read_secdef_chunks(secdef_file):
+    remainder = b''                                   #Partial row left over from the previous block
+    while True:
+        chunk = secdef_file.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        end = chunk.rfind(b'\n') + 1                  #End of the last complete row in this block
+        if end == 0:
+            remainder += chunk
+            continue
+        yield remainder + chunk[:end]
+        remainder = chunk[end:]
+    if remainder:                                     #Last row without a terminating newline
+        yield remainder + b'\n'
+
+##########################################################################################################
+# FUNCTION:    scan_secdef_blocks()
+# DESCRIPTION: Counts the security types in blocks of secdef data, then searches only the futures rows
+#              for the product complex, and scans only the futures rows with asset GE for the remaining
+#              fields of interest.  Returns relevant data for solutions to the three questions
+# INPUT:       Iterable of bytes-like blocks of complete rows (bytes or mmap)
+# OUTPUT:      Counter d167{} with number of instruments for each security type, Counter d462{} with
+#              number of futures instruments for each product complex, and list earliestExpirationName[]
+#              with the earliest four (expiration, sequence, name) for futures instruments with asset
+#              'GE' and zero legs, sorted by expiration.  The sequence number keeps rows with the same
+#              expiration in file order, and no more than four entries are ever stored
+##########################################################################################################
+def scan_secdef_blocks(secdef_blocks):
+    d167 = Counter(dict.fromkeys(SECURITY_TYPES, 0))           #Number of instruments (initialized to 0) for each security type
+    d462 = Counter(dict.fromkeys(PRODUCT_COMPLEXES, 0))        #Number of futures instruments (initialized to 0) for each product complex
+    earliestExpirationName = []                                #Earliest four expirations and names
+    sequence = 0                                               #Sequence number of futures with asset GE and zero legs
+    security_types = Counter()                                 #Number of instruments for each raw security type
+    product_complexes = []                                     #Product complex of each futures row
+    collect_product_complex = product_complexes.append         #Bind methods used in the row loop to locals
+    finditer = SECDEF_FIELD_RE.finditer
+    futures_field = FUTURES_FIELD
+    for secdef_block in secdef_blocks:                         #For each block of complete rows
+        security_types.update(SECURITY_TYPE_RE.findall(secdef_block))   #Collect all security types in one scan
+        block_end = len(secdef_block)
+        find = secdef_block.find
+        rfind = secdef_block.rfind
+        futures_pos = find(futures_field)
+        while futures_pos >= 0:                                #For each futures row (167=FUT)
+            row_start = rfind(b'\n', 0, futures_pos) + 1
+            row_end = find(b'\n', futures_pos)
+            if row_end < 0:                                    #Last row without a terminating newline
+                row_end = block_end
+            product_complex_pos = find(UNDERLYING_PRODUCT_FIELD, row_start, row_end)
+            if product_complex_pos >= 0:                       #Underlying product (tag 462)
+                value_start = product_complex_pos + len(UNDERLYING_PRODUCT_FIELD)
+                value_end = find(SOH, value_start, row_end)
+                if value_end < 0:
+                    value_end = row_end
+                collect_product_complex(secdef_block[value_start:value_end])
+            if find(ASSET_GE_FIELD, row_start, row_end) >= 0:  #Scan fields only if asset GE (6937=GE)
+                row_fields = [None] * ROW_FIELD_SLOTS          #Field values of this row, indexed by tag code
+                for match in finditer(secdef_block, row_start, row_end):   #For each field of interest
+                    code = match.lastindex                     #Integer code of the matched tag
+                    row_fields[code] = match[code]             #Store value in the slot for this tag
+                expiration = row_fields[EXPIRATION_CODE]
+                names = row_fields[NAMES_CODE]
+                if (row_fields[NOLEGS_CODE] is None and       #Asset = 'GE' with zero legs,
+                        expiration is not None and names is not None):   #skip rows without expiration or name
+                    expiration = expiration.decode('ascii')
+                    if (len(earliestExpirationName) < EARLIEST_EXPIRATIONS or
+                            expiration < earliestExpirationName[-1][0]):   #One of earliest expirations so far
+                        names = names.decode('ascii')
+                        bisect.insort(earliestExpirationName, (expiration, sequence, names))   #Store expiration and names
+                        del earliestExpirationName[EARLIEST_EXPIRATIONS:]
+                    sequence += 1
+            futures_pos = find(futures_field, row_end)
+    for security_type, count in security_types.items():       #Map each distinct value to its canonical key
+        key = SECURITY_TYPE_KEYS.get(security_type) or security_type.decode('ascii')
+        d167[key] += count                                     #Store number of instruments for this security type
+    for product_complex, count in Counter(product_complexes).items():   #Count in C, map each distinct value once
+        key = PRODUCT_COMPLEX_KEYS.get(product_complex) or product_complex.decode('ascii')
+        d462[key] += count                                     #Store number of futures instruments for this product complex
+    return d167, d462, earliestExpirationName
 
 ##########################################################################################################
 # FUNCTION:    parse_secdef_file()
-# DESCRIPTION: Parses secdef.DAT file, extracts and stores relevant data in dictionaries for solutions
-#              to the three questions
-# INPUT:       secdef.DAT file
-# OUTPUT:      Dictionaries with extracted data from secdef.DAT file
-##########################################################################################################
-def parse_secdef_file():
-    print("\nParsing secdef.DAT file...\n")
-    secdef_filename = 'secdef.DAT'            
-    secdef_filepath = os.path.realpath(secdef_filename)
+# DESCRIPTION: Parses secdef data, extracts and returns relevant data for solutions to the three
+#              questions.  An unzipped secdef file on disk is memory mapped and scanned in
+#              place; an opened (streamed) secdef data file object is read in blocks of complete rows
+#              and closed when done
+# INPUT:       Path of unzipped secdef file (secdef.DAT by default), or binary file object with the
+#              secdef data
+# OUTPUT:      Tuple of d167{}, d462{} and earliestExpirationName[] (see scan_secdef_blocks()), or None
+#              on error
+##########################################################################################################
+def parse_secdef_file(secdef_file=SECDEF_FILENAME):
+    print("\nParsing secdef data...\n")
     try:
-        with open(secdef_filepath, 'r') as secdefFile:  #Open secdef.DAT file for read
-            for line in secdefFile:        #For each row in the file
-                field = line.split(SOH)    #Get all fields/columns separated by SOH delimiter
-                futures = False
-                assetGE = False
-                nolegs = False
-                underlying_product = False
-                for data in field:         #For each data in field/column
-                    if (data.split('=')[0] == SECURITY_TYPE_TAG):  #If security type tag 167
-                        d167[data.split('=')[1]] += 1              #Store number of instruments for this security type
-                        if (data.split('=')[1] == FUTURES):        #If futures instrument
-                            futures = True
-                    elif (data.split('=')[0] == UNDERLYING_PRODUCT_TAG): #If tag 462, increment number for this product complex
-                        underlying_product = True
-                        product_complex = data.split('=')[1]      #Get product complex                
-                    elif (data == ASSET_GE and not assetGE):      #If asset GE (6937=GE)
-                        assetGE = True
-                    elif (data.split('=')[0] == NOLEGS_TAG):      #If nolegs data (tag 555)
-                        nolegs = True
-                    elif (data.split('=')[0] == NAMES_TAG):       #If names data (tag 55)
-                        names = data.split('=')[1]
-                    elif (data.split('=')[0] == EXPIRATION_TAG):  #If maturity month/year expiration data (tag 200)
-                        expiration = data.split('=')[1]
-                if futures:                                   #Futures instrument
-                    if underlying_product:                    #Underlying product (tag 462)
-                        #d462.get(product_complex, 0)
-                        d462[product_complex] += 1            #Store number of futures instruments for this product complex
-                    if assetGE and not nolegs:                #Asset = 'GE' with zero legs
-                        dNameExpiration[names] = expiration   #Store names and expiration
-        return True
+        if not isinstance(secdef_file, str):               #Read from already opened (streamed) secdef data
+            with secdef_file:
+                return scan_secdef_blocks(read_secdef_chunks(secdef_file))
+        with open(secdef_file, 'rb') as secdefFile:        #Open secdef file for binary read
+            if not os.fstat(secdefFile.fileno()).st_size:  #Empty file can not be memory mapped
+                return scan_secdef_blocks([])
+            with mmap.mmap(secdefFile.fileno(), 0, access=mmap.ACCESS_READ) as secdef_map:
+                return scan_secdef_blocks([secdef_map])    #Scan the whole mapped file in place
     except FileNotFoundError:
         print("\nFile not found error!\n")
-        return False                         
-    except KeyError:
+        return None
+    except ValueError:                                     #Non-ASCII value (UnicodeDecodeError)
         print("\nFile parse/process error!\n")
-        return False                 
+        return None
+    except (OSError, EOFError):
+        print("\nFile read/unzip error!\n")
+        return None
+
+##########################################################################################################
+# FUNCTION:    parse_secdef_zipfile()
+# DESCRIPTION: Unzips and parses a local secdef.dat.gz zipped file.  Runs in a worker process when
+#              several zipped files are parsed in parallel
+# INPUT:       Path of secdef.dat.gz zipped file, number of rapidgzip threads (all cores if None)
+# OUTPUT:      Tuple of d167{}, d462{} and earliestExpirationName[] (see scan_secdef_blocks()), or None
+#              on error
+##########################################################################################################
+def parse_secdef_zipfile(zipfilepath, parallelization=None):
+    secdef_file = open_secdef_zipfile(zipfilepath, parallelization)
+    if secdef_file is None:
+        return None
+    return parse_secdef_file(secdef_file)
+
+##########################################################################################################
+# FUNCTION:    merge_secdef_results()
+# DESCRIPTION: Merges the data extracted from several secdef files: adds up the instrument counts and
+#              keeps the earliest four expirations overall.  Names are unique within a file but the
+#              same contract is listed in every file, so each name is kept only once, with its first
+#              entry in (expiration, file, sequence) order.  A name with different expirations in
+#              different files is therefore reported with its earliest expiration, from the first
+#              file listing it there.  Each file's earliest four rows hold four distinct names, so
+#              no name of the overall earliest four can be missing from them
+# INPUT:       List of tuples of d167{}, d462{} and earliestExpirationName[] (see scan_secdef_blocks())
+# OUTPUT:      Tuple of merged d167{}, d462{} and earliestExpirationName[]
+##########################################################################################################
+def merge_secdef_results(results):
+    d167 = Counter()
+    d462 = Counter()
+    for result167, result462, _ in results:
+        d167.update(result167)                  #Counter.update() adds counts and keeps zero counts
+        d462.update(result462)
+    expirations = sorted((expiration, fileIndex, sequence, names)
+                         for fileIndex, result in enumerate(results)
+                         for expiration, sequence, names in result[2])   #Same expirations stay in file order
+    earliestExpirationName = []
+    mergedNames = set()
+    for expiration, _, sequence, names in expirations:
+        if names not in mergedNames:                   #First entry of this name only
+            mergedNames.add(names)
+            earliestExpirationName.append((expiration, sequence, names))
+            if len(earliestExpirationName) == EARLIEST_EXPIRATIONS:
+                break
+    return d167, d462, earliestExpirationName
 
 ##########################################################################################################
 # FUNCTION:    print_solution1()
 # DESCRIPTION: Prints output of solution to Question 1: How many instruments of each security type
 #              (tag 167) exist?
-# INPUT:       Dictionary d167{}
+# INPUT:       Counter d167{}
 # OUPPUT:      Data output to screen containing answer to question 1
 ##########################################################################################################
-def print_solution1():
+def print_solution1(d167):
     print("\nHere's the output of solution to question 1...\n")
     for key,val in d167.items():
         print(key, " has ", val, "instruments")
@@ -169,10 +420,10 @@ def print_solution1():
 # FUNCTION:    print_solution2()
 # DESCRIPTION: Prints output of solution to Question 2: How many futures (tag 167) instruments exist
 #              in each product complex (tag 462)?
-# INPUT:       Dictionary d462{}
+# INPUT:       Counter d462{}
 # OUTPUT:      Data output to screen containing answer to question 2
 ##########################################################################################################
-def print_solution2():
+def print_solution2(d462):
     print("\nHere's the output of solution to question 2...\n")
     for key,val in d462.items():
         print("Product complex ", key, " has ", val, "futures instruments")
@@ -182,36 +433,73 @@ def print_solution2():
 # DESCRIPTION: Prints output of solution to Question 3: What are the names (tag 55) of the earliest
 #              four expirations (tag 200) for the futures (tag 167) instruments with asset (tag 6937)
 #              'GE' and have zero legs (tag 555)?
-# INPUT:       Dictionary dNameExpiration{}
+# INPUT:       List earliestExpirationName[]
 # OUTPUT:      Data output to screen containing answer to question 3
 ##########################################################################################################
-def print_solution3():
-    sortedExpirationName = sorted(dNameExpiration.items(), key=lambda x: x[1]) #Sort by expiration date
+def print_solution3(earliestExpirationName):
     print("\nHere's the output of solution to question 3...\n")
-    for key,val in sortedExpirationName[:4]:                        #Get first four earliest expirations
-        print ("Name: ", key, " has expiration: ", val)
+    for expiration,_,names in earliestExpirationName:   #Already the first four earliest expirations
+        print ("Name: ", names, " has expiration: ", expiration)
 
 ##########################################################################################################
 # FUNCTION:    main()
 # DESCRIPTION: Performs the following tasks:
-#              1) Download the secdef.dat.gz file from FTP cmegroup
-#              2) Parses secdef.DAT file and extracts data for solutions to the three questions
+#              1) Download the secdef.dat.gz file from FTP cmegroup and unzip it on the fly, or unzip
+#                 the given local secdef.dat.gz files
+#              2) Parses secdef data and extracts data for solutions to the three questions, and merges
+#                 the data of all files
 #              3) Prints output of solution to question 1
 #              4) Prints output of solution to question 2
 #              5) Prints output of solution to question 3
-# INPUT:       CME Group FTP site with a secdef.dat.gz file
+# INPUT:       CME Group FTP site with a secdef.dat.gz file, command line arguments
+#              --url URL : download the secdef.dat.gz file from this FTP/HTTP/HTTPS URL instead
+#              --keep-secdef : store the unzipped secdef.DAT file in current working directory and parse it
+#              --zipfile PATH : parse a local secdef.dat.gz file instead of downloading it; repeat to
+#                               parse several files in parallel, one process per file
+#              --verbose : also print working directory and file paths
 # OUTPUT:      Data output to screen containing answers to three questions
 ##########################################################################################################
 def main():
-    if (download_secdef_zipfile()):  #Download and unzip secdef.dat.gz file from CME Group public FTP site
-        if (parse_secdef_file()):    #Parse and extract data from secdef.DAT file
-            print_solution1()        #Output solution for solution 1 to screen
-            print_solution2()        #Output solution for question 2 to screen
-            print_solution3()        #Output solution for question 3 to screen
+    argparser = argparse.ArgumentParser(description='Parse the CME Group secdef.dat FIX file.')
+    argparser.add_argument('--url', default=SECDEF_URL,
+                           help='URL (ftp, http or https) of the secdef.dat.gz file to download')
+    argparser.add_argument('--keep-secdef', action='store_true',
+                           help='store the unzipped secdef.DAT file in current working directory and parse it')
+    argparser.add_argument('--zipfile', action='append', metavar='PATH',
+                           help='parse this local secdef.dat.gz file instead of downloading it; '
+                                'repeat to parse several files in parallel')
+    argparser.add_argument('--verbose', action='store_true',
+                           help='also print working directory and file paths')
+    args = argparser.parse_args()
+
+    if args.zipfile:
+        if len(args.zipfile) == 1:
+            results = [parse_secdef_zipfile(args.zipfile[0])]   #Unzip and parse local secdef.dat.gz file
         else:
-            print("\nError in parse_secdef_file()...exiting program\n")
+            cpu_count = os.cpu_count() or 1
+            workers = min(len(args.zipfile), cpu_count)        #Processes and their unzip threads share the cores
+            parallelization = max(1, cpu_count // workers)
+            with ProcessPoolExecutor(max_workers=workers) as executor:   #Unzip and parse each file in its own process
+                results = list(executor.map(parse_secdef_zipfile, args.zipfile,
+                                            [parallelization] * len(args.zipfile)))
+        failed = [path for path, result in zip(args.zipfile, results) if result is None]
+        if failed:
+            print("\nError in parse_secdef_zipfile() for", ", ".join(failed), "...exiting program\n")
+            return
     else:
-        print("\nError in download_secdef_zipfile()...exiting program\n")
+        secdef_file = download_secdef_zipfile(args.url, args.keep_secdef, args.verbose)  #Download and unzip secdef.dat.gz file from CME Group public FTP site
+        if secdef_file is None:
+            print("\nError in download_secdef_zipfile()...exiting program\n")
+            return
+        results = [parse_secdef_file(secdef_file)]              #Parse and extract data from secdef data
+        if results[0] is None:
+            print("\nError in parse_secdef_file()...exiting program\n")
+            return
+
+    d167, d462, earliestExpirationName = merge_secdef_results(results)
+    print_solution1(d167)                   #Output solution for solution 1 to screen
+    print_solution2(d462)                   #Output solution for question 2 to screen
+    print_solution3(earliestExpirationName) #Output solution for question 3 to screen
 
 if __name__ == "__main__":
     main()